@@ -19,12 +19,39 @@ Usage:
 import argparse
 import asyncio
 import json
+import socket
 import time
-import statistics
 import csv
+import heapq
 from pathlib import Path
 from typing import Optional
 import httpx
+import numpy as np
+import orjson
+
+try:
+    import uvloop
+except ImportError:  # optional: fall back to the default asyncio loop
+    uvloop = None
+
+
+# Targeted check for choices[0].delta.content on the raw SSE payload: find the
+# key and look at the next byte (a closing quote means empty content). Avoids
+# decoding and parsing every token; orjson.loads is only the fallback.
+_CONTENT_KEY = b'"content":"'
+_QUOTE = ord('"')
+
+
+def _has_content(buf: bytearray, start: int, end: int) -> bool:
+    """Return True if the SSE payload buf[start:end] has a non-empty delta.content."""
+    i = buf.find(_CONTENT_KEY, start, end)
+    if i != -1:
+        return buf[i + len(_CONTENT_KEY)] != _QUOTE
+    # Index directly; a malformed event raises instead of allocating defaults
+    try:
+        return bool(orjson.loads(buf[start:end])["choices"][0]["delta"].get("content"))
+    except (KeyError, IndexError, TypeError, AttributeError, orjson.JSONDecodeError):
+        return False
 
 
 class BenchmarkResult:
@@ -76,26 +103,34 @@ async def run_benchmark_request(
             ) as response:
                 response.raise_for_status()
                 
-                async for line in response.aiter_lines():
-                    if not line or not line.startswith("data: "):
-                        continue
-                    
-                    data = line[6:]
-                    if data == "[DONE]":
-                        break
-                    
-                    # Record TTFB on first token
-                    if first_token_time is None:
-                        first_token_time = time.perf_counter()
-                        result.ttfb = first_token_time - start_time
-                    
-                    try:
-                        chunk = json.loads(data)
-                        content = chunk.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                        if content:
+                # Frame events straight from the raw byte stream: one reusable
+                # buffer, bounded prefix/regex checks and no per-line str copies
+                buf = bytearray()
+                done = False
+                async for raw in response.aiter_raw():
+                    buf += raw
+                    start = 0
+                    while (idx := buf.find(b"\n\n", start)) != -1:
+                        event_start, start = start, idx + 2
+                        
+                        if not buf.startswith(b"data: ", event_start, idx):
+                            continue
+                        
+                        payload_start = event_start + 6
+                        if idx - payload_start == 6 and buf.startswith(b"[DONE]", payload_start):
+                            done = True
+                            break
+                        
+                        # Record TTFB on first token
+                        if first_token_time is None:
+                            first_token_time = time.perf_counter()
+                            result.ttfb = first_token_time - start_time
+                        
+                        if _has_content(buf, payload_start, idx):
                             token_count += 1
-                    except json.JSONDecodeError:
-                        continue
+                    if done:
+                        break
+                    del buf[:start]
         else:
             response = await client.post(
                 f"{url}/v1/chat/completions",
@@ -144,9 +179,24 @@ async def run_suite(
     print(f"\n📊 Running suite: {suite['name']}")
     print(f"   Prompts: {len(prompts)}, Max tokens: {max_tokens}, Concurrency: {concurrency}")
     
-    results = []
-    
-    async with httpx.AsyncClient(timeout=120.0) as client:
+    # Size the pool to the concurrency so every in-flight request gets a
+    # kept-alive connection; HTTP/2 multiplexes them when the gateway is TLS.
+    # TCP_NODELAY stops Nagle from holding back small SSE writes.
+    # Identity encoding keeps SSE chunks from being buffered by gzip.
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=concurrency * 2,
+            max_keepalive_connections=concurrency * 2,
+            keepalive_expiry=60,
+        ),
+        socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)],
+    )
+    async with httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(120.0, connect=5.0),
+        headers={"Accept-Encoding": "identity"},
+    ) as client:
         # Use semaphore to limit concurrent requests
         semaphore = asyncio.Semaphore(concurrency)
         
@@ -156,24 +206,37 @@ async def run_suite(
                     client, url, prompt, max_tokens, api_key, stream=True
                 )
         
-        if concurrency == 1:
-            # Sequential mode: one at a time (for baseline)
-            for i, prompt in enumerate(prompts):
-                print(f"   [{i+1}/{len(prompts)}] Running (sequential)...", end="\r")
-                result = await run_benchmark_request(
-                    client, url, prompt, max_tokens, api_key, stream=True
-                )
-                results.append(result)
-        else:
-            # Concurrent mode: run in parallel (to trigger batching)
-            print(f"   Running {len(prompts)} requests with concurrency={concurrency}...")
-            tasks = [run_with_semaphore(prompt) for prompt in prompts]
-            results = await asyncio.gather(*tasks)
+        # Always dispatch through the semaphore on one event loop;
+        # concurrency=1 still serializes requests for the baseline.
+        mode = "sequential" if concurrency == 1 else f"concurrency={concurrency}"
+        print(f"   Running {len(prompts)} requests ({mode})...")
+        tasks = [run_with_semaphore(prompt) for prompt in prompts]
+        results = await asyncio.gather(*tasks)
     
     print(f"   ✅ Completed {len(results)} requests")
     return list(results)
 
 
+# Below this many samples heapq beats the NumPy call overhead
+_SMALL_SAMPLE = 64
+
+
+def percentiles(data: np.ndarray, ps: list[int]) -> list[float]:
+    """
+    Nearest-rank percentiles (sorted(data)[int(n * p / 100)]) without a full sort.
+    
+    Only a few order statistics are needed, so large samples use np.partition
+    (introselect) and small ones a bounded heapq.nsmallest.
+    """
+    n = len(data)
+    idxs = [min(int(n * p / 100), n - 1) for p in ps]
+    if n < _SMALL_SAMPLE:
+        smallest = heapq.nsmallest(max(idxs) + 1, data.tolist())
+        return [smallest[k] for k in idxs]
+    part = np.partition(data, idxs)
+    return [float(part[k]) for k in idxs]
+
+
 def calculate_stats(results: list[BenchmarkResult]) -> dict:
     """Calculate statistics from benchmark results."""
     successful = [r for r in results if r.status == "success"]
@@ -181,33 +244,32 @@ def calculate_stats(results: list[BenchmarkResult]) -> dict:
     if not successful:
         return {"error": "No successful requests"}
     
-    ttfbs = [r.ttfb for r in successful]
-    latencies = [r.total_latency for r in successful]
-    tokens = [r.tokens for r in successful]
+    n = len(successful)
+    ttfbs = np.fromiter((r.ttfb for r in successful), dtype=np.float64, count=n)
+    latencies = np.fromiter((r.total_latency for r in successful), dtype=np.float64, count=n)
+    tokens = np.fromiter((r.tokens for r in successful), dtype=np.float64, count=n)
     
-    # Calculate tokens per second
-    tokens_per_sec = [
-        r.tokens / r.total_latency if r.total_latency > 0 else 0 
-        for r in successful
-    ]
+    # Calculate tokens per second (0 where latency is 0)
+    tokens_per_sec = np.divide(
+        tokens, latencies, out=np.zeros_like(tokens), where=latencies > 0
+    )
     
-    def percentile(data, p):
-        sorted_data = sorted(data)
-        idx = int(len(sorted_data) * p / 100)
-        return sorted_data[min(idx, len(sorted_data) - 1)]
+    ttfb_p50, ttfb_p95, ttfb_p99 = percentiles(ttfbs, [50, 95, 99])
+    lat_p50, lat_p95, lat_p99 = percentiles(latencies, [50, 95, 99])
+    (tps_p50,) = percentiles(tokens_per_sec, [50])
     
     return {
-        "count": len(successful),
-        "errors": len(results) - len(successful),
-        "ttfb_p50": round(percentile(ttfbs, 50) * 1000, 2),  # ms
-        "ttfb_p95": round(percentile(ttfbs, 95) * 1000, 2),
-        "ttfb_p99": round(percentile(ttfbs, 99) * 1000, 2),
-        "latency_p50": round(percentile(latencies, 50) * 1000, 2),
-        "latency_p95": round(percentile(latencies, 95) * 1000, 2),
-        "latency_p99": round(percentile(latencies, 99) * 1000, 2),
-        "tokens_avg": round(statistics.mean(tokens), 1),
-        "tokens_per_sec_avg": round(statistics.mean(tokens_per_sec), 1),
-        "tokens_per_sec_p50": round(percentile(tokens_per_sec, 50), 1),
+        "count": n,
+        "errors": len(results) - n,
+        "ttfb_p50": round(ttfb_p50 * 1000, 2),  # ms
+        "ttfb_p95": round(ttfb_p95 * 1000, 2),
+        "ttfb_p99": round(ttfb_p99 * 1000, 2),
+        "latency_p50": round(lat_p50 * 1000, 2),
+        "latency_p95": round(lat_p95 * 1000, 2),
+        "latency_p99": round(lat_p99 * 1000, 2),
+        "tokens_avg": round(float(tokens.mean()), 1),
+        "tokens_per_sec_avg": round(float(tokens_per_sec.mean()), 1),
+        "tokens_per_sec_p50": round(tps_p50, 1),
     }
 
 
@@ -298,4 +360,9 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # On uvloop the client's own event loop is less likely to cap measured
+    # throughput at high concurrency
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
@@ -1,40 +1,142 @@
 """
 API key management and authentication.
 """
+import fcntl
+import hashlib
 import json
 import os
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict
 from datetime import datetime
 
 # Simple file-based API key storage (for M1)
 # In production, use a proper database
 KEYS_FILE = Path(__file__).parent / "api_keys.json"
 
+# Keys are cached in memory; the file's mtime is re-checked at most once per
+# _RELOAD_INTERVAL seconds so edits on disk (or by another worker) are picked up.
+# Worker processes share the file through flock on the file itself: reloads
+# take a shared lock, read-modify-write an exclusive one, so nobody reads a
+# half-written file and concurrent updates are not lost. The file is
+# rewritten in place (not renamed) because it is bind-mounted in compose.
+_RELOAD_INTERVAL = 1.0
+_keys_lock = threading.Lock()
+_keys: Dict[str, Dict] = {}
+_keys_by_digest: Dict[bytes, Dict] = {}
+_keys_mtime_ns: Optional[int] = None
+_next_check = 0.0
+
+
+def _digest(api_key: str) -> bytes:
+    """
+    Fixed-size BLAKE2b digest used as the lookup key for verification.
+    
+    Looking up digests instead of raw keys means lookup timing cannot reveal
+    how much of a guessed key matches a real one.
+    """
+    return hashlib.blake2b(api_key.encode(), digest_size=16).digest()
 
-def _load_keys() -> Dict[str, Dict]:
-    """Load API keys from file."""
-    if not KEYS_FILE.exists():
-        # Create default key for development
-        default_keys = {
-            "sk-dev-default-key-12345": {
-                "key_id": "default",
-                "created_at": datetime.now().isoformat(),
-                "rate_limit": 30,  # requests per minute
-                "active": True
-            }
+
+def _set_keys(keys: Dict[str, Dict], mtime_ns: int):
+    """Swap in a new key mapping and its digest index. Caller must hold _keys_lock."""
+    global _keys, _keys_by_digest, _keys_mtime_ns
+    _keys_by_digest = {_digest(key): info for key, info in keys.items()}
+    _keys = keys
+    _keys_mtime_ns = mtime_ns
+
+
+@contextmanager
+def _locked_keys_file(operation: int):
+    """
+    Open KEYS_FILE under an flock (fcntl.LOCK_SH or fcntl.LOCK_EX).
+    
+    Shared (read) locks open the file read-only, so a read-only mount of
+    api_keys.json keeps working; only writers need write access.
+    """
+    if operation == fcntl.LOCK_SH:
+        fd, mode = os.open(KEYS_FILE, os.O_RDONLY), "r"
+    else:
+        fd, mode = os.open(KEYS_FILE, os.O_RDWR | os.O_CREAT, 0o644), "r+"
+    with os.fdopen(fd, mode) as f:
+        fcntl.flock(f, operation)  # released when the file is closed
+        yield f
+
+
+def _read_keys_file(f) -> Optional[Dict[str, Dict]]:
+    """Parse the locked keys file (None if it was just created)."""
+    f.seek(0)
+    data = f.read()
+    return json.loads(data) if data.strip() else None
+
+
+def _update_keys(mutate: Callable[[Dict[str, Dict]], bool]) -> bool:
+    """
+    Read-modify-write the keys file under an exclusive flock.
+    
+    A new (empty) key store is seeded with the default development key.
+    Caller must hold _keys_lock.
+    
+    Args:
+        mutate: Edits the current keys in place; returns True if it changed them
+    
+    Returns:
+        Whatever mutate returned
+    """
+    with _locked_keys_file(fcntl.LOCK_EX) as f:
+        keys = _read_keys_file(f)
+        seeded = keys is None
+        if seeded:
+            keys = _default_keys()
+        changed = mutate(keys)
+        if changed or seeded:
+            f.seek(0)
+            f.truncate()
+            json.dump(keys, f, indent=2)
+            f.flush()
+        _set_keys(keys, os.fstat(f.fileno()).st_mtime_ns)
+    return changed
+
+
+def _default_keys() -> Dict[str, Dict]:
+    """Default key for development, written to a new key store."""
+    return {
+        "sk-dev-default-key-12345": {
+            "key_id": "default",
+            "created_at": datetime.now().isoformat(),
+            "rate_limit": 30,  # requests per minute
+            "active": True
         }
-        _save_keys(default_keys)
-        return default_keys
+    }
+
+
+def _reload_keys():
+    """Re-read the keys file if it changed. Caller must hold _keys_lock."""
+    try:
+        st = os.stat(KEYS_FILE)
+    except FileNotFoundError:
+        st = None
+    if st is None or st.st_size == 0:
+        _update_keys(lambda keys: False)  # creates and seeds the file
+        return
     
-    with open(KEYS_FILE, "r") as f:
-        return json.load(f)
+    if st.st_mtime_ns != _keys_mtime_ns:
+        with _locked_keys_file(fcntl.LOCK_SH) as f:
+            _set_keys(_read_keys_file(f), os.fstat(f.fileno()).st_mtime_ns)
 
 
-def _save_keys(keys: Dict[str, Dict]):
-    """Save API keys to file."""
-    with open(KEYS_FILE, "w") as f:
-        json.dump(keys, f, indent=2)
+def _load_keys() -> Dict[str, Dict]:
+    """Return the cached API keys, reloading from file when it has changed."""
+    global _next_check
+    
+    now = time.monotonic()
+    if now >= _next_check:
+        with _keys_lock:
+            _reload_keys()
+            _next_check = now + _RELOAD_INTERVAL
+    return _keys
 
 
 def verify_api_key(api_key: str) -> Optional[Dict]:
@@ -47,8 +149,8 @@ def verify_api_key(api_key: str) -> Optional[Dict]:
     Returns:
         Key metadata if valid, None otherwise
     """
-    keys = _load_keys()
-    key_info = keys.get(api_key)
+    _load_keys()
+    key_info = _keys_by_digest.get(_digest(api_key))
     
     if not key_info or not key_info.get("active", True):
         return None
@@ -73,19 +175,22 @@ def create_api_key(key_id: str, rate_limit: int = 30) -> str:
     """
     import secrets
     
-    keys = _load_keys()
-    
     # Generate a secure key
     api_key = f"sk-{secrets.token_urlsafe(32)}"
     
-    keys[api_key] = {
+    info = {
         "key_id": key_id,
         "created_at": datetime.now().isoformat(),
         "rate_limit": rate_limit,
         "active": True
     }
     
-    _save_keys(keys)
+    def add(keys: Dict[str, Dict]) -> bool:
+        keys[api_key] = info
+        return True
+    
+    with _keys_lock:
+        _update_keys(add)
     return api_key
 
 
@@ -106,21 +211,25 @@ def list_api_keys() -> list[Dict]:
 
 def revoke_api_key(api_key: str) -> bool:
     """Revoke an API key."""
-    keys = _load_keys()
-    if api_key in keys:
-        keys[api_key]["active"] = False
-        _save_keys(keys)
+    def revoke(keys: Dict[str, Dict]) -> bool:
+        if api_key not in keys:
+            return False
+        keys[api_key] = {**keys[api_key], "active": False}
         return True
-    return False
+    
+    with _keys_lock:
+        return _update_keys(revoke)
 
 
 def revoke_api_key_by_id(key_id: str) -> bool:
     """Revoke an API key by key_id."""
-    keys = _load_keys()
-    for api_key, info in keys.items():
-        if info.get("key_id") == key_id:
-            keys[api_key]["active"] = False
-            _save_keys(keys)
-            return True
-    return False
+    def revoke(keys: Dict[str, Dict]) -> bool:
+        for api_key, info in keys.items():
+            if info.get("key_id") == key_id:
+                keys[api_key] = {**info, "active": False}
+                return True
+        return False
+    
+    with _keys_lock:
+        return _update_keys(revoke)
 
@@ -11,49 +11,61 @@ Usage:
     config = FeatureConfig.from_headers(request.headers)
     worker = get_worker_for_backend(config.backend)
 """
+import sys
 from dataclasses import dataclass
-from typing import Optional
+
+# Backend URL mapping (container hostnames); keys interned for fast lookups
+_BACKEND_URLS = {
+    sys.intern(backend): url
+    for backend, url in {
+        "vllm": "http://vllm:8000",
+        "vllm-quant": "http://vllm-quant:8000",
+        "tgi": "http://tgi:8000",
+        "tgi-tp": "http://tgi-tp:8000",
+        "trt": "http://trt:8000",
+    }.items()
+}
+_VALID_BACKENDS = frozenset(_BACKEND_URLS)
+_VALID_QUANTS = frozenset({"none", "awq", "int8", "fp8"})
 
 
-@dataclass
+@dataclass(slots=True)
 class FeatureConfig:
     """Feature toggle configuration parsed from request headers."""
     
     backend: str = "vllm"  # Which engine to route to
     quant: str = "none"    # Quantization mode (info only, backend determines actual quant)
     
-    # Backend URL mapping (container hostnames)
-    BACKEND_URLS = {
-        "vllm": "http://vllm:8000",
-        "vllm-quant": "http://vllm-quant:8000",
-        "tgi": "http://tgi:8000",
-        "tgi-tp": "http://tgi-tp:8000",
-        "trt": "http://trt:8000",
-    }
-    
-    VALID_BACKENDS = {"vllm", "vllm-quant", "tgi", "tgi-tp", "trt"}
-    VALID_QUANTS = {"none", "awq", "int8", "fp8"}
+    BACKEND_URLS = _BACKEND_URLS
+    VALID_BACKENDS = _VALID_BACKENDS
+    VALID_QUANTS = _VALID_QUANTS
     
     @classmethod
     def from_headers(cls, headers: dict) -> "FeatureConfig":
         """Parse feature config from request headers."""
-        backend = headers.get("x-backend", "vllm").lower()
-        quant = headers.get("x-quant", "none").lower()
-        
-        # Validate backend
-        if backend not in cls.VALID_BACKENDS:
-            backend = "vllm"  # Fallback to default
+        # Headers are usually already lowercase: check before allocating via .lower()
+        backend = headers.get("x-backend")
+        if backend is None:
+            backend = "vllm"
+        elif backend not in _VALID_BACKENDS:
+            backend = backend.lower()
+            if backend not in _VALID_BACKENDS:
+                backend = "vllm"  # Fallback to default
         
-        # Validate quant
-        if quant not in cls.VALID_QUANTS:
+        quant = headers.get("x-quant")
+        if quant is None:
             quant = "none"
+        elif quant not in _VALID_QUANTS:
+            quant = quant.lower()
+            if quant not in _VALID_QUANTS:
+                quant = "none"
         
         return cls(backend=backend, quant=quant)
     
     @property
     def backend_url(self) -> str:
         """Get the URL for the selected backend."""
-        return self.BACKEND_URLS.get(self.backend, self.BACKEND_URLS["vllm"])
+        return _BACKEND_URLS.get(self.backend, _BACKEND_URLS["vllm"])
     
     def to_dict(self) -> dict:
         """Return config as dict (for logging/metrics)."""
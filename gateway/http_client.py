@@ -0,0 +1,110 @@
+"""
+Shared httpx transport for the backend workers.
+
+All workers (vLLM, TGI, TRT-LLM, any number of backend URLs) send through one
+process-wide transport, i.e. one connection pool, instead of a pool per
+worker. HTTP/2 is enabled but httpx only negotiates it over TLS (ALPN); it
+does not speak cleartext h2c, so the compose backends (plain http://) use
+HTTP/1.1 keep-alive connections from the pool, one per in-flight request.
+
+Gateway <-> engine traffic is many small request/response and SSE messages
+on long-lived connections, so every backend socket gets:
+  - TCP_NODELAY: no Nagle delay on small writes
+  - SO_KEEPALIVE: idle pooled connections are probed instead of silently
+    dying behind a NAT/conntrack timeout
+and no transport-level retries (a retried generation would run twice).
+
+NIC-level tuning (IRQ/queue pinning, ring sizes) belongs to the host, not
+the container; see ops/compose/README.md.
+"""
+import os
+import socket
+from typing import Optional
+
+import httpx
+
+SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+# For request bodies pre-encoded with orjson (content=...), which skips
+# httpx's stdlib json encoder
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Streaming requests ask for uncompressed SSE: tokens are forwarded as soon
+# as they arrive instead of going through a per-chunk zlib inflate
+SSE_HEADERS = {
+    **JSON_HEADERS,
+    "Accept": "text/event-stream",
+    "Accept-Encoding": "identity",
+}
+
+# Idle connections are kept for a minute so bursts reuse them
+DEFAULT_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=60.0
+)
+
+
+def make_transport(
+    http2: bool = False,
+    limits: Optional[httpx.Limits] = None,
+    uds: Optional[str] = None
+) -> httpx.AsyncHTTPTransport:
+    """
+    Build a tuned transport for a backend client.
+
+    httpx ignores the client's http2/limits arguments when a transport is
+    passed, so they are set here instead.
+
+    Args:
+        http2: Offer HTTP/2 on https:// connections (needs the h2 package);
+            http:// backends always use HTTP/1.1
+        limits: Connection pool limits (default: DEFAULT_LIMITS)
+        uds: Unix domain socket path to connect through instead of TCP
+            (TCP socket options do not apply to it)
+
+    Returns:
+        Transport to pass as AsyncClient(transport=...)
+    """
+    return httpx.AsyncHTTPTransport(
+        http2=http2,
+        limits=limits or DEFAULT_LIMITS,
+        retries=0,
+        uds=uds,
+        socket_options=None if uds else SOCKET_OPTIONS
+    )
+
+
+# Pool shared by every worker (BACKEND_POOL_MAX / BACKEND_POOL_KEEPALIVE)
+SHARED_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("BACKEND_POOL_MAX", "2048")),
+    max_keepalive_connections=int(os.getenv("BACKEND_POOL_KEEPALIVE", "1024")),
+    keepalive_expiry=60.0
+)
+
+_shared_transport: Optional[httpx.AsyncHTTPTransport] = None
+
+
+def shared_transport() -> httpx.AsyncHTTPTransport:
+    """
+    Return the process-wide backend transport, creating it on first use.
+    
+    Workers wrap it in their own AsyncClient (for base_url and timeout) but
+    must not close it: closing a client closes its transport. It is closed
+    once, by close_shared_transport() on app shutdown.
+    """
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = make_transport(http2=True, limits=SHARED_LIMITS)
+    return _shared_transport
+
+
+async def close_shared_transport():
+    """Drain and close the shared backend connection pool."""
+    global _shared_transport
+    if _shared_transport is not None:
+        transport, _shared_transport = _shared_transport, None
+        await transport.aclose()
@@ -1,11 +1,28 @@
 """
 Request/response logging and metrics.
+
+Request log entries are appended by a background writer thread so the
+event loop never blocks on file I/O: log_request/log_response only enqueue.
+Usage statistics are kept as running counters (checkpointed to usage.json)
+instead of re-scanning the request log on every /v1/usage call. Each uvicorn
+worker merges its own increments into the shared checkpoint under a file
+lock, so counts stay correct with WORKERS > 1.
 """
+import atexit
+import fcntl
 import logging
-import json
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Dict, Optional
+
+import orjson
 
 # Setup logging directory
 LOG_DIR = Path(__file__).parent / "logs"
@@ -14,10 +31,226 @@ LOG_DIR.mkdir(exist_ok=True)
 # Request log file
 REQUEST_LOG = LOG_DIR / "requests.jsonl"
 
+# Usage checkpoint, merged at most every _CHECKPOINT_INTERVAL s (shared by
+# all worker processes, serialized by flock on USAGE_LOCK)
+USAGE_CHECKPOINT = LOG_DIR / "usage.json"
+USAGE_LOCK = LOG_DIR / "usage.lock"
+_CHECKPOINT_INTERVAL = 10.0
+
+# Background writer: flush up to _FLUSH_BATCH entries or every _FLUSH_INTERVAL s
+_FLUSH_BATCH = 256
+_FLUSH_INTERVAL = 0.05
+_log_queue: "queue.Queue[bytes]" = queue.Queue()
+_log_fd = os.open(REQUEST_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+
+# Running usage counters; latency percentiles come from a fixed-size
+# reservoir sample of successful response latencies. _usage/_latency_sample
+# are this process's view of the totals (last checkpoint + own increments);
+# _pending/_pending_sample hold the increments not yet merged into it.
+_RESERVOIR_SIZE = 1024
+_usage_lock = threading.Lock()
+_usage = {"total_requests": 0, "latency_sum_ms": 0, "latency_count": 0}
+_latency_sample: list[int] = []
+_pending = dict.fromkeys(_usage, 0)
+_pending_sample: list[int] = []
+_usage_dirty = False
+_last_checkpoint = 0.0
+
+# QueueListeners started by setup_logger, stopped (and drained) by flush_logs
+_listeners: list[logging.handlers.QueueListener] = []
+
+
+def _record_latency(counters: Dict[str, int], sample: list[int], latency_ms: int):
+    """Add a successful response latency to a counter set. Caller holds _usage_lock."""
+    counters["latency_sum_ms"] += latency_ms
+    counters["latency_count"] += 1
+    if len(sample) < _RESERVOIR_SIZE:
+        sample.append(latency_ms)
+    else:
+        slot = random.randrange(counters["latency_count"])
+        if slot < _RESERVOIR_SIZE:
+            sample[slot] = latency_ms
+
+
+def _merge_samples(a: list[int], a_count: int, b: list[int], b_count: int) -> list[int]:
+    """Combine two reservoir samples, weighting each by the latencies it represents."""
+    if len(a) + len(b) <= _RESERVOIR_SIZE:
+        return a + b
+    take_a = min(len(a), round(_RESERVOIR_SIZE * a_count / (a_count + b_count)))
+    take_b = min(len(b), _RESERVOIR_SIZE - take_a)
+    return random.sample(a, take_a) + random.sample(b, take_b)
+
+
+def _read_checkpoint() -> Optional[Dict[str, Any]]:
+    """Load the shared checkpoint (None if missing or unreadable). Caller holds USAGE_LOCK."""
+    try:
+        saved = orjson.loads(USAGE_CHECKPOINT.read_bytes())
+        saved["counters"] = {k: int(saved["counters"].get(k, 0)) for k in _usage}
+        saved["latency_sample"] = list(saved["latency_sample"][:_RESERVOIR_SIZE])
+        return saved
+    except (OSError, orjson.JSONDecodeError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def _write_checkpoint(saved: Dict[str, Any]):
+    """Atomically replace the shared checkpoint. Caller holds USAGE_LOCK."""
+    tmp = USAGE_CHECKPOINT.with_name(f"{USAGE_CHECKPOINT.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(orjson.dumps(saved))
+    os.replace(tmp, USAGE_CHECKPOINT)
+
+
+@contextmanager
+def _checkpoint_lock():
+    """Hold an exclusive flock on USAGE_LOCK (serializes worker processes)."""
+    fd = os.open(USAGE_LOCK, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _seed_usage():
+    """Restore counters from the checkpoint, or rebuild them from the request log once."""
+    with _checkpoint_lock():
+        saved = _read_checkpoint()
+        if saved is None:
+            # First process up: rebuild from the log and publish it, so other
+            # workers starting now read the checkpoint instead of rescanning
+            counters = dict.fromkeys(_usage, 0)
+            sample: list[int] = []
+            with open(REQUEST_LOG, "rb") as f:
+                for line in f:
+                    try:
+                        entry = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if entry.get("type") == "request":
+                        counters["total_requests"] += 1
+                    elif entry.get("type") == "response" and entry.get("status") == "success":
+                        latency = entry.get("latency_ms", 0)
+                        if latency > 0:
+                            _record_latency(counters, sample, latency)
+            saved = {"counters": counters, "latency_sample": sample}
+            _write_checkpoint(saved)
+    _usage.update(saved["counters"])
+    _latency_sample[:] = saved["latency_sample"]
+
+
+def _checkpoint_usage(force: bool = False):
+    """
+    Merge this process's pending increments into the shared checkpoint and
+    refresh this process's view with the other workers' totals.
+    
+    Runs at most once per _CHECKPOINT_INTERVAL unless forced. A process with
+    nothing pending only re-reads the checkpoint, so an idle worker still
+    picks up what the busy ones counted.
+    """
+    global _usage_dirty, _last_checkpoint
+    
+    now = time.monotonic()
+    if not force and now - _last_checkpoint < _CHECKPOINT_INTERVAL:
+        return
+    _last_checkpoint = now
+    with _usage_lock:
+        dirty = _usage_dirty
+        pending = dict(_pending)
+        pending_sample = list(_pending_sample)
+        for k in _pending:
+            _pending[k] = 0
+        _pending_sample.clear()
+        _usage_dirty = False
+    
+    with _checkpoint_lock():
+        saved = _read_checkpoint() or {"counters": dict.fromkeys(_usage, 0), "latency_sample": []}
+        counters = saved["counters"]
+        if dirty:
+            saved["latency_sample"] = _merge_samples(
+                saved["latency_sample"], counters["latency_count"],
+                pending_sample, pending["latency_count"]
+            )
+            for k in counters:
+                counters[k] += pending[k]
+            _write_checkpoint(saved)
+    
+    # Refresh this process's view with the other workers' merged totals,
+    # keeping anything counted while the checkpoint was being written
+    with _usage_lock:
+        for k in _usage:
+            _usage[k] = counters[k] + _pending[k]
+        _latency_sample[:] = _merge_samples(
+            saved["latency_sample"], counters["latency_count"],
+            _pending_sample, _pending["latency_count"]
+        )
+
+
+def _drain(batch: list[bytes]):
+    """Append any queued entries to batch without blocking."""
+    while len(batch) < _FLUSH_BATCH:
+        try:
+            batch.append(_log_queue.get_nowait())
+        except queue.Empty:
+            break
+
+
+def _writer_loop():
+    """Batch queued entries and append them with a single write."""
+    while True:
+        batch = [_log_queue.get()]
+        deadline = time.monotonic() + _FLUSH_INTERVAL
+        while len(batch) < _FLUSH_BATCH:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(_log_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        os.write(_log_fd, b"".join(batch))
+        _checkpoint_usage()
+
+
+@atexit.register
+def flush_logs():
+    """
+    Drain queued log records and request log entries, then checkpoint usage.
+    
+    Registered with atexit, but also called from the app's shutdown hook:
+    uvicorn re-raises SIGTERM after a graceful shutdown, which skips atexit.
+    """
+    while _listeners:
+        _listeners.pop().stop()
+    batch: list[bytes] = []
+    _drain(batch)
+    while batch:
+        os.write(_log_fd, b"".join(batch))
+        batch = []
+        _drain(batch)
+    _checkpoint_usage(force=True)
+
+
+_seed_usage()
+threading.Thread(target=_writer_loop, name="request-log-writer", daemon=True).start()
+
+
+def _append_entry(log_entry: Dict[str, Any]):
+    """Queue a log entry for the background writer (non-blocking)."""
+    _log_queue.put_nowait(orjson.dumps(log_entry) + b"\n")
+
 
 def setup_logger(name: str = "gateway") -> logging.Logger:
-    """Setup application logger."""
+    """
+    Setup application logger.
+    
+    Console and file handlers run on a QueueListener thread, so logging a
+    request only enqueues the record instead of writing to the terminal and
+    disk from the event loop. Calling it again for the same name returns the
+    already configured logger instead of adding a second set of handlers.
+    """
     logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
     logger.setLevel(logging.INFO)
     
     # Console handler
@@ -27,24 +260,49 @@ def setup_logger(name: str = "gateway") -> logging.Logger:
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
     
     # File handler
     file_handler = logging.FileHandler(LOG_DIR / "gateway.log")
     file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        records, console_handler, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    _listeners.append(listener)
+    logger.addHandler(logging.handlers.QueueHandler(records))
     
     return logger
 
 
+def _count_usage(request: bool = False, latency_ms: int = 0):
+    """Update the running usage counters."""
+    global _usage_dirty
+    with _usage_lock:
+        if request:
+            _usage["total_requests"] += 1
+            _pending["total_requests"] += 1
+        if latency_ms:
+            _record_latency(_usage, _latency_sample, latency_ms)
+            _record_latency(_pending, _pending_sample, latency_ms)
+        _usage_dirty = True
+
+
 def log_request(
     logger: logging.Logger,
     request_id: str,
     request_data: Dict[str, Any],
     key_id: str
 ):
-    """Log an incoming request."""
+    """
+    Log an incoming request.
+    
+    Args:
+        request_data: Request summary with model, stream, max_tokens and
+            message_count (not the full request body)
+    """
     log_entry = {
         "timestamp": datetime.now().isoformat(),
         "request_id": request_id,
@@ -53,12 +311,11 @@ def log_request(
         "model": request_data.get("model"),
         "stream": request_data.get("stream", False),
         "max_tokens": request_data.get("max_tokens"),
-        "message_count": len(request_data.get("messages", []))
+        "message_count": request_data.get("message_count", 0)
     }
     
-    # Write to JSONL file
-    with open(REQUEST_LOG, "a") as f:
-        f.write(json.dumps(log_entry) + "\n")
+    _append_entry(log_entry)
+    _count_usage(request=True)
     
     logger.info(f"Request {request_id} from {key_id}: model={log_entry['model']}, stream={log_entry['stream']}")
 
@@ -78,53 +335,42 @@ def log_response(
         "latency_ms": latency_ms
     }
     
-    # Write to JSONL file
-    with open(REQUEST_LOG, "a") as f:
-        f.write(json.dumps(log_entry) + "\n")
+    _append_entry(log_entry)
+    if status == "success" and latency_ms > 0:
+        _count_usage(latency_ms=latency_ms)
     
     logger.info(f"Response {request_id}: status={status}, latency={latency_ms}ms")
 
 
 def get_usage_stats() -> Dict[str, Any]:
-    """Aggregate usage statistics from log file."""
-    if not REQUEST_LOG.exists():
-        return {
-            "total_requests": 0,
-            "total_tokens": 0,
-            "avg_latency_ms": 0
-        }
-    
-    total_requests = 0
-    total_tokens = 0
-    latencies = []
-    
-    # Read all log entries
-    with open(REQUEST_LOG, "r") as f:
-        for line in f:
-            try:
-                entry = json.loads(line.strip())
-                if entry.get("type") == "request":
-                    total_requests += 1
-                    # Estimate tokens (rough estimate: ~4 chars per token)
-                    # In a real implementation, we'd track actual token counts
-                    # For now, we'll use a placeholder
-                elif entry.get("type") == "response" and entry.get("status") == "success":
-                    latency = entry.get("latency_ms", 0)
-                    if latency > 0:
-                        latencies.append(latency)
-            except json.JSONDecodeError:
-                continue
+    """
+    Return usage statistics from the running counters (O(1) in log size).
+    
+    Blocking (may re-read the shared checkpoint), so call it from a thread pool.
+    """
+    _checkpoint_usage()
+    with _usage_lock:
+        total_requests = _usage["total_requests"]
+        latency_sum = _usage["latency_sum_ms"]
+        latency_count = _usage["latency_count"]
+        sample = sorted(_latency_sample)
     
     # Calculate average latency
-    avg_latency = sum(latencies) / len(latencies) if latencies else 0
+    avg_latency = latency_sum / latency_count if latency_count else 0
     
     # For token count, we'll estimate based on requests
     # In a real implementation, we'd track this from the usage field in responses
     total_tokens = total_requests * 50  # Rough estimate
     
+    def percentile(p: int) -> int:
+        if not sample:
+            return 0
+        return sample[min(int(len(sample) * p / 100), len(sample) - 1)]
+    
     return {
         "total_requests": total_requests,
         "total_tokens": total_tokens,
-        "avg_latency_ms": int(avg_latency)
+        "avg_latency_ms": int(avg_latency),
+        "p50_latency_ms": percentile(50),
+        "p95_latency_ms": percentile(95),
     }
-
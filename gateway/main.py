@@ -2,27 +2,59 @@
 Gateway service - OpenAI-compatible API with authentication and rate limiting.
 """
 import asyncio
-import json
+import logging
+import os
 import time
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import AsyncGenerator, Optional
 
+import orjson
 from fastapi import FastAPI, HTTPException, Header, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 
-from worker_factory import create_worker
+from worker_factory import create_worker, shutdown_all
+from http_client import close_shared_transport
 from auth import verify_api_key, list_api_keys, create_api_key, revoke_api_key, revoke_api_key_by_id
-from logger import setup_logger, log_request, log_response, get_usage_stats
+from logger import setup_logger, log_request, log_response, get_usage_stats, flush_logs
 from metrics import get_metrics, RequestMetrics
+from tokenizer import count_tokens, load_encoding
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson instead of the stdlib json module."""
+    
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """App startup/shutdown hooks."""
+    # Load the tokenizer before serving; it may fetch its BPE file over the network
+    await run_in_threadpool(load_encoding)
+    # Resolve the backend model name up front instead of on the first request
+    warmup = getattr(worker, "warmup", None)
+    if warmup is not None:
+        await warmup()
+    yield
+    # Close workers, then drain the backend connection pool before the loop
+    # goes away
+    await worker.close()
+    await shutdown_all()
+    await close_shared_transport()
+    flush_logs()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="LLM Inference Gateway",
     description="OpenAI-compatible API for LLM inference",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware - allow localhost for development
@@ -39,6 +71,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress non-streaming JSON (long completions, key lists). Starlette skips
+# text/event-stream responses, so SSE is never buffered by gzip.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Rate limiting (simplified for M1 - will be enhanced in later milestones)
 # Note: slowapi requires additional setup for async endpoints, so we'll implement
 # a simple rate limiter in a later milestone. For now, basic auth is sufficient.
@@ -51,6 +87,18 @@ logger = setup_logger()
 # - WORKER_TYPE=vllm: Real LLM via vLLM backend
 worker = create_worker()
 
+# STREAM_PASSTHROUGH=1: forward the backend's SSE bytes unchanged when the
+# worker supports it (no per-token parse/re-serialize). Chunk ids and model
+# names are then the backend's own rather than the gateway's.
+STREAM_PASSTHROUGH = os.getenv("STREAM_PASSTHROUGH", "0") == "1"
+
+# SSE coalescing: buffered frames are flushed once they reach SSE_FLUSH_BYTES
+# or SSE_FLUSH_INTERVAL_MS after the last flush, whether or not another token
+# has arrived by then. The first token is always sent immediately so TTFB is
+# unaffected. SSE_FLUSH_BYTES=0 sends one write per token.
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "4096"))
+SSE_FLUSH_INTERVAL_NS = int(float(os.getenv("SSE_FLUSH_INTERVAL_MS", "20")) * 1_000_000)
+
 # Request/Response models
 class ChatMessage(BaseModel):
     role: str
@@ -63,20 +111,41 @@ class ChatCompletionRequest(BaseModel):
     max_tokens: Optional[int] = 100
     stream: bool = False
 
-class ChatCompletionChunk(BaseModel):
-    id: str
-    object: str = "chat.completion.chunk"
-    created: int
-    model: str
-    choices: list[dict]
-
-class ChatCompletionResponse(BaseModel):
-    id: str
-    object: str = "chat.completion"
-    created: int
-    model: str
-    choices: list[dict]
-    usage: dict
+# SSE framing, precomputed so streamed frames are plain bytes concatenation
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+_SSE_DONE = b"data: [DONE]\n\n"
+
+# Passthrough token counting: frames with non-empty delta.content. The last
+# _CONTENT_TAIL bytes of each chunk are searched again with the next one, so
+# a key split across network chunks is still counted exactly once.
+_CONTENT_KEY = b'"content":"'
+_EMPTY_CONTENT = b'"content":""'
+_CONTENT_TAIL = len(_EMPTY_CONTENT) - 1
+
+# Bounds on bearer token length (generated keys are ~46 chars)
+_MIN_KEY_LEN = 10
+_MAX_KEY_LEN = 256
+
+def _authenticate(authorization: Optional[str]) -> dict:
+    """
+    Resolve a Bearer Authorization header to key metadata or raise 401.
+    
+    verify_api_key is an in-memory digest lookup (see auth.py), so no
+    additional cache is kept here.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid API key")
+    
+    # Slice off the scheme (a replace() would also rewrite "Bearer " inside
+    # the token); tokens of implausible length are rejected without a lookup
+    api_key = authorization[7:]
+    if not _MIN_KEY_LEN <= len(api_key) <= _MAX_KEY_LEN:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    key_info = verify_api_key(api_key)
+    if not key_info:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return key_info
 
 @app.get("/health")
 async def health():
@@ -86,7 +155,8 @@ async def health():
 @app.get("/metrics")
 async def metrics():
     """Prometheus metrics endpoint."""
-    return get_metrics()
+    # Rendering walks the whole registry; keep it off the event loop
+    return await run_in_threadpool(get_metrics)
 
 @app.get("/v1/models")
 async def list_models():
@@ -112,8 +182,12 @@ async def get_keys():
         "data": keys
     }
 
+# Allowed format for new key_ids. Revocation looks ids up as-is, so keys
+# created before the pattern existed can still be revoked.
+KEY_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
 class CreateKeyRequest(BaseModel):
-    key_id: str
+    key_id: str = Field(pattern=KEY_ID_PATTERN)
     rate_limit: int = 30
 
 @app.post("/v1/keys")
@@ -129,14 +203,8 @@ async def create_key(body: CreateKeyRequest):
 @app.delete("/v1/keys/{key_id}")
 async def delete_key(key_id: str, authorization: Optional[str] = Header(None)):
     """Revoke an API key by key_id."""
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid API key")
-    
     # Verify the authorization key is valid
-    api_key = authorization.replace("Bearer ", "")
-    key_info = verify_api_key(api_key)
-    if not key_info:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    _authenticate(authorization)
     
     # Revoke the key by key_id
     success = revoke_api_key_by_id(key_id)
@@ -148,7 +216,7 @@ async def delete_key(key_id: str, authorization: Optional[str] = Header(None)):
 @app.get("/v1/usage")
 async def get_usage():
     """Get usage statistics."""
-    stats = get_usage_stats()
+    stats = await run_in_threadpool(get_usage_stats)
     return stats
 
 @app.post("/v1/chat/completions")
@@ -164,21 +232,27 @@ async def chat_completions(
     request_id = str(uuid.uuid4())
     
     # Verify API key
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid API key")
-    
-    api_key = authorization.replace("Bearer ", "")
-    key_info = verify_api_key(api_key)
-    if not key_info:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    key_info = _authenticate(authorization)
     
     # Log request
-    log_request(logger, request_id, body.model_dump(), key_info["key_id"])
+    # Log a summary only; dumping the whole body copies every message
+    log_request(logger, request_id, {
+        "model": body.model,
+        "stream": body.stream,
+        "max_tokens": body.max_tokens,
+        "message_count": len(body.messages)
+    }, key_info["key_id"])
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Request {request_id} body: {body.model_dump()}")
     
     # Generate response
     if body.stream:
+        if STREAM_PASSTHROUGH and hasattr(worker, "generate_stream_raw"):
+            stream = _passthrough_chat_completion(request_id, body, start_time)
+        else:
+            stream = _stream_chat_completion(request_id, body, start_time)
         return StreamingResponse(
-            _stream_chat_completion(request_id, body, start_time),
+            stream,
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -194,7 +268,8 @@ async def chat_completions(
             latency_ms = int((time.time() - start_time) * 1000)
             log_response(logger, request_id, latency_ms, "success")
             req_metrics.finish("success")
-            return response
+            # Serialize with orjson directly, skipping FastAPI's jsonable_encoder
+            return ORJSONResponse(response)
         except Exception as e:
             req_metrics.finish("error")
             raise
@@ -204,33 +279,35 @@ async def _generate_chat_completion(
     body: ChatCompletionRequest,
     start_time: float,
     req_metrics: RequestMetrics = None
-) -> ChatCompletionResponse:
+) -> dict:
     """Generate a non-streaming chat completion."""
     # Get the last user message
-    user_messages = [msg for msg in body.messages if msg.role == "user"]
-    if not user_messages:
+    last_user = next((msg for msg in reversed(body.messages) if msg.role == "user"), None)
+    if last_user is None:
         raise HTTPException(status_code=400, detail="No user messages found")
     
-    prompt = user_messages[-1].content
+    prompt = last_user.content
     
     # Record prompt tokens
-    prompt_tokens = len(prompt.split())
+    prompt_tokens = count_tokens(prompt)
     if req_metrics:
         req_metrics.record_prompt_tokens(prompt_tokens)
     
     # Generate response using worker
     full_response = await worker.generate(prompt, max_tokens=body.max_tokens or 100)
     # Count completion tokens
-    completion_tokens = len(full_response.split())
+    completion_tokens = count_tokens(full_response)
     if req_metrics:
         req_metrics.record_token(completion_tokens)
     
     # Format response
-    return ChatCompletionResponse(
-        id=request_id,
-        created=int(start_time),
-        model=body.model,
-        choices=[{
+    # Outbound only, so a plain dict (no Pydantic model) serialized by orjson
+    return {
+        "id": request_id,
+        "object": "chat.completion",
+        "created": int(start_time),
+        "model": body.model,
+        "choices": [{
             "index": 0,
             "message": {
                 "role": "assistant",
@@ -238,18 +315,18 @@ async def _generate_chat_completion(
             },
             "finish_reason": "stop"
         }],
-        usage={
-            "prompt_tokens": len(prompt.split()),
-            "completion_tokens": len(full_response.split()),
-            "total_tokens": len(prompt.split()) + len(full_response.split())
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
         }
-    )
+    }
 
 async def _stream_chat_completion(
     request_id: str,
     body: ChatCompletionRequest,
     start_time: float
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[bytes, None]:
     """Generate a streaming chat completion (SSE format)."""
     # Initialize metrics for streaming
     req_metrics = RequestMetrics(model=body.model, stream=True)
@@ -258,50 +335,97 @@ async def _stream_chat_completion(
     token_count = 0
     
     # Get the last user message
-    user_messages = [msg for msg in body.messages if msg.role == "user"]
-    if not user_messages:
-        yield f"data: {json.dumps({'error': 'No user messages found'})}\n\n"
+    last_user = next((msg for msg in reversed(body.messages) if msg.role == "user"), None)
+    if last_user is None:
+        yield _SSE_PREFIX + orjson.dumps({"error": "No user messages found"}) + _SSE_SUFFIX
         req_metrics.finish("error")
         return
     
-    prompt = user_messages[-1].content
-    req_metrics.record_prompt_tokens(len(prompt.split()))
+    prompt = last_user.content
+    req_metrics.record_prompt_tokens(count_tokens(prompt))
+    
+    # Chunk skeleton: only delta.content changes between frames, so every frame
+    # is serialized with orjson instead of building a Pydantic model
+    chunk_data = {
+        "id": request_id,
+        "object": "chat.completion.chunk",
+        "created": int(start_time),
+        "model": body.model,
+        "choices": [{
+            "index": 0,
+            "delta": {"role": "assistant", "content": None},
+            "finish_reason": None
+        }]
+    }
+    delta = chunk_data["choices"][0]["delta"]
+    
+    # Frames waiting to be written (see SSE_FLUSH_BYTES)
+    buf = bytearray()
+    last_flush = time.monotonic_ns()
+    
+    # Stream response using worker. While frames are buffered, the next token
+    # is awaited as a task with the flush deadline as timeout, so a backend
+    # pause does not hold already-generated tokens back.
+    tokens = worker.generate_stream(prompt, max_tokens=body.max_tokens or 100).__aiter__()
+    pending = None  # in-flight tokens.__anext__() task, kept across flushes
     
     try:
-        # Stream response using worker
-        async for chunk in worker.generate_stream(prompt, max_tokens=body.max_tokens or 100):
-            # Record TTFB on first token
+        while True:
+            if pending is None and not buf:
+                try:
+                    chunk = await tokens.__anext__()
+                except StopAsyncIteration:
+                    break
+            else:
+                if pending is None:
+                    pending = asyncio.ensure_future(tokens.__anext__())
+                timeout = None
+                if buf:
+                    timeout = max(0.0, (last_flush + SSE_FLUSH_INTERVAL_NS - time.monotonic_ns()) / 1e9)
+                done, _ = await asyncio.wait((pending,), timeout=timeout)
+                if not done:
+                    yield bytes(buf)
+                    buf.clear()
+                    last_flush = time.monotonic_ns()
+                    continue
+                task, pending = pending, None
+                try:
+                    chunk = task.result()
+                except StopAsyncIteration:
+                    break
+            
+            token_count += 1
+            delta["content"] = chunk
+            frame = _SSE_PREFIX + orjson.dumps(chunk_data) + _SSE_SUFFIX
+            
+            # Record TTFB on first token and send it without buffering
             if first_token:
                 req_metrics.record_first_token()
                 first_token = False
+                last_flush = time.monotonic_ns()
+                yield frame
+                continue
             
-            token_count += 1
-            chunk_data = ChatCompletionChunk(
-                id=request_id,
-                created=int(start_time),
-                model=body.model,
-                choices=[{
-                    "index": 0,
-                    "delta": {"role": "assistant", "content": chunk},
-                    "finish_reason": None
-                }]
-            )
-            yield f"data: {chunk_data.model_dump_json()}\n\n"
-            await asyncio.sleep(0.01)  # Small delay to simulate token generation
+            if not SSE_FLUSH_BYTES:
+                yield frame
+                continue
+            
+            buf += frame
+            now = time.monotonic_ns()
+            if len(buf) >= SSE_FLUSH_BYTES or now - last_flush >= SSE_FLUSH_INTERVAL_NS:
+                yield bytes(buf)
+                buf.clear()
+                last_flush = now
         
-        # Send final chunk
-        final_chunk = ChatCompletionChunk(
-            id=request_id,
-            created=int(start_time),
-            model=body.model,
-            choices=[{
-                "index": 0,
-                "delta": {},
-                "finish_reason": "stop"
-            }]
-        )
-        yield f"data: {final_chunk.model_dump_json()}\n\n"
-        yield "data: [DONE]\n\n"
+        # Send final chunk (same skeleton, empty delta) with anything still buffered
+        chunk_data["choices"][0] = {
+            "index": 0,
+            "delta": {},
+            "finish_reason": "stop"
+        }
+        buf += _SSE_PREFIX + orjson.dumps(chunk_data) + _SSE_SUFFIX
+        buf += _SSE_DONE
+        yield bytes(buf)
         
         # Log and record metrics
         latency_ms = int((time.time() - start_time) * 1000)
@@ -312,10 +436,85 @@ async def _stream_chat_completion(
     except Exception as e:
         req_metrics.finish("error")
         # Optionally re-raise or log the exception
-        # yield f"data: {json.dumps({'error': str(e)})}\n\n" # If you want to send error to client
+        # yield _SSE_PREFIX + orjson.dumps({"error": str(e)}) + _SSE_SUFFIX # If you want to send error to client
         raise # Re-raise to ensure it's logged by the server if not handled elsewhere
     
+    finally:
+        # Client went away mid-stream: stop the backend read
+        if pending is not None:
+            pending.cancel()
+    
+async def _passthrough_chat_completion(
+    request_id: str,
+    body: ChatCompletionRequest,
+    start_time: float
+) -> AsyncGenerator[bytes, None]:
+    """Forward the backend's SSE stream as raw bytes, recording metrics only."""
+    req_metrics = RequestMetrics(model=body.model, stream=True)
+    req_metrics.start()
+    first_token = True
+    token_count = 0
+    
+    # Get the last user message
+    last_user = next((msg for msg in reversed(body.messages) if msg.role == "user"), None)
+    if last_user is None:
+        yield _SSE_PREFIX + orjson.dumps({"error": "No user messages found"}) + _SSE_SUFFIX
+        req_metrics.finish("error")
+        return
+    
+    prompt = last_user.content
+    req_metrics.record_prompt_tokens(count_tokens(prompt))
+    
+    tail = b""  # end of the previous chunk, for keys split across chunks
+    
+    try:
+        async for chunk in worker.generate_stream_raw(prompt, max_tokens=body.max_tokens or 100):
+            # Record TTFB on first bytes
+            if first_token:
+                req_metrics.record_first_token()
+                first_token = False
+            
+            # Count content frames without parsing them. Keys wholly inside
+            # tail were counted with the previous chunk; tail is too short to
+            # hold a whole empty-content key.
+            window = tail + chunk
+            token_count += (
+                window.count(_CONTENT_KEY) - tail.count(_CONTENT_KEY)
+                - window.count(_EMPTY_CONTENT)
+            )
+            tail = window[-_CONTENT_TAIL:]
+            yield chunk
+        
+        # Log and record metrics
+        latency_ms = int((time.time() - start_time) * 1000)
+        log_response(logger, request_id, latency_ms, "success")
+        req_metrics.record_token(token_count)
+        req_metrics.finish("success")
+        
+    except Exception:
+        req_metrics.finish("error")
+        raise
+
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvloop + httptools (both from uvicorn[standard]); requests are already
+    # logged by the gateway, so uvicorn's per-request access log is dropped.
+    # WORKERS > 1 runs that many processes to scale past the GIL. uvicorn
+    # needs the import string for that; a single process is given the app
+    # object, since the import string would import this module a second time
+    # (as "main") and create another worker and logger.
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Worker processes inherit this and aggregate /metrics through it
+        import tempfile
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="gateway-metrics-")
+    uvicorn.run(
+        "main:app" if workers > 1 else app,
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        workers=workers,
+    )
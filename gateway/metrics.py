@@ -13,7 +13,14 @@ Key Learning: Why these metrics matter
   - Latency: Measures total request time (prefill + decode)
   - Tokens/s: Measures throughput efficiency
 """
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Tuple
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, Gauge, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+)
 from fastapi import Response
 
 # =============================================================================
@@ -43,11 +50,12 @@ REQUEST_COUNT = Counter(
     ['model', 'status', 'stream']
 )
 
-# Active requests gauge
+# Active requests gauge (summed over live worker processes when WORKERS > 1)
 ACTIVE_REQUESTS = Gauge(
     'llm_active_requests',
     'Number of currently active requests',
-    ['model']
+    ['model'],
+    multiprocess_mode='livesum'
 )
 
 # Tokens generated counter
@@ -74,10 +82,37 @@ PROMPT_TOKENS = Histogram(
 )
 
 
+# With several uvicorn workers (WORKERS > 1), each process writes its metrics
+# to files in PROMETHEUS_MULTIPROC_DIR and a scrape aggregates all of them;
+# otherwise a scrape would only see whichever worker answered it.
+if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    _registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(_registry)
+else:
+    _registry = None  # the default (per-process) registry
+
+# Rendered exposition text is reused for this long, so overlapping scrapes
+# share one generate_latest() walk of the registry
+METRICS_CACHE_TTL = 1.0
+_metrics_lock = threading.Lock()
+_metrics_cache = (0.0, b"")
+
+
 def get_metrics() -> Response:
-    """Generate Prometheus metrics response."""
+    """
+    Generate Prometheus metrics response.
+    
+    Blocking (walks the whole registry), so call it from a thread pool.
+    """
+    global _metrics_cache
+    with _metrics_lock:
+        rendered_at, content = _metrics_cache
+        now = time.monotonic()
+        if now - rendered_at >= METRICS_CACHE_TTL:
+            content = generate_latest(_registry) if _registry else generate_latest()
+            _metrics_cache = (now, content)
     return Response(
-        content=generate_latest(),
+        content=content,
         media_type=CONTENT_TYPE_LATEST
     )
 
@@ -86,30 +121,68 @@ def get_metrics() -> Response:
 # Metric Recording Helpers
 # =============================================================================
 
+class _MetricChildren(NamedTuple):
+    """Label-bound metric children for one (model, stream) pair."""
+    active: Gauge
+    ttfb: Histogram
+    prompt_tokens: Histogram
+    tokens_generated: Counter
+    tokens_per_request: Histogram
+    latency: Dict[str, Histogram]
+    count: Dict[str, Counter]
+
+
+# (model, stream) -> children; the label sets are small and fixed, so this
+# replaces a labels() hash + registry lookup on every observation
+_CHILDREN: Dict[Tuple[str, bool], _MetricChildren] = {}
+
+
+def _get_children(model: str, stream: bool) -> _MetricChildren:
+    """Return (creating once) the metric children for a model/stream pair."""
+    children = _CHILDREN.get((model, stream))
+    if children is None:
+        children = _MetricChildren(
+            active=ACTIVE_REQUESTS.labels(model=model),
+            ttfb=TTFB.labels(model=model),
+            prompt_tokens=PROMPT_TOKENS.labels(model=model),
+            tokens_generated=TOKENS_GENERATED.labels(model=model),
+            tokens_per_request=TOKENS_PER_REQUEST.labels(model=model),
+            latency={
+                status: REQUEST_LATENCY.labels(model=model, status=status)
+                for status in ("success", "error")
+            },
+            count={
+                status: REQUEST_COUNT.labels(model=model, status=status, stream=str(stream))
+                for status in ("success", "error")
+            },
+        )
+        _CHILDREN[(model, stream)] = children
+    return children
+
+
 class RequestMetrics:
     """Context manager for recording request metrics."""
     
     def __init__(self, model: str, stream: bool = False):
         self.model = model
         self.stream = stream
-        self.start_time = None
-        self.first_token_time = None
+        self.start_ns = None
+        self.first_token_ns = None
         self.tokens = 0
         self.status = "success"
+        
+        self._children = _get_children(model, stream)
     
     def start(self):
         """Call at request start."""
-        import time
-        self.start_time = time.time()
-        ACTIVE_REQUESTS.labels(model=self.model).inc()
+        self.start_ns = time.monotonic_ns()
+        self._children.active.inc()
     
     def record_first_token(self):
         """Call when first token is generated (for streaming)."""
-        import time
-        if self.first_token_time is None:
-            self.first_token_time = time.time()
-            ttfb = self.first_token_time - self.start_time
-            TTFB.labels(model=self.model).observe(ttfb)
+        if self.first_token_ns is None:
+            self.first_token_ns = time.monotonic_ns()
+            self._children.ttfb.observe((self.first_token_ns - self.start_ns) / 1e9)
     
     def record_token(self, count: int = 1):
         """Call for each token generated."""
@@ -117,24 +190,28 @@ class RequestMetrics:
     
     def finish(self, status: str = "success"):
         """Call at request end."""
-        import time
         self.status = status
-        end_time = time.time()
-        latency = end_time - self.start_time
+        latency = (time.monotonic_ns() - self.start_ns) / 1e9
         
         # Record metrics
-        REQUEST_LATENCY.labels(model=self.model, status=status).observe(latency)
-        REQUEST_COUNT.labels(
-            model=self.model, 
-            status=status, 
-            stream=str(self.stream)
-        ).inc()
-        ACTIVE_REQUESTS.labels(model=self.model).dec()
+        children = self._children
+        latency_child = children.latency.get(status)
+        if latency_child is not None:
+            latency_child.observe(latency)
+            children.count[status].inc()
+        else:
+            REQUEST_LATENCY.labels(model=self.model, status=status).observe(latency)
+            REQUEST_COUNT.labels(
+                model=self.model, 
+                status=status, 
+                stream=str(self.stream)
+            ).inc()
+        children.active.dec()
         
         if self.tokens > 0:
-            TOKENS_GENERATED.labels(model=self.model).inc(self.tokens)
-            TOKENS_PER_REQUEST.labels(model=self.model).observe(self.tokens)
+            children.tokens_generated.inc(self.tokens)
+            children.tokens_per_request.observe(self.tokens)
     
     def record_prompt_tokens(self, count: int):
         """Record prompt token count."""
-        PROMPT_TOKENS.labels(model=self.model).observe(count)
+        self._children.prompt_tokens.observe(count)
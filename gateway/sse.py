@@ -0,0 +1,99 @@
+"""
+Server-Sent Events parsing for OpenAI-compatible backends.
+
+vLLM, TGI and TRT-LLM all stream /v1/chat/completions as:
+    data: {"choices": [{"delta": {"content": "Hello"}}]}
+    data: [DONE]
+"""
+from typing import AsyncGenerator
+
+import httpx
+import orjson
+
+
+_DATA_PREFIX = b"data: "
+_DATA_DONE = b"data: [DONE]"
+_DATA_DONE_LEN = len(_DATA_DONE)
+_CR = ord("\r")
+_CONTENT_KEY = b'"content":"'
+_CONTENT_KEY_LEN = len(_CONTENT_KEY)
+
+
+def _parse_content(data: memoryview):
+    """Return delta.content of one event payload (None if absent or malformed)."""
+    # Index directly; a malformed event raises instead of allocating defaults
+    try:
+        return orjson.loads(data)["choices"][0]["delta"].get("content")
+    except (KeyError, IndexError, TypeError, AttributeError, orjson.JSONDecodeError):
+        return None
+
+
+def _extract_content(buf: bytearray, view: memoryview, start: int, end: int):
+    """
+    Return delta.content of the event payload buf[start:end].
+    
+    Engines emit compact JSON, so the content string is found with a plain
+    byte search for "content":" and the next quote. Payloads this does not
+    cover (escapes in the text, null or missing content, other spacing) go
+    through the full orjson parse.
+    """
+    i = buf.find(_CONTENT_KEY, start, end)
+    if i >= 0:
+        j = i + _CONTENT_KEY_LEN
+        q = buf.find(b'"', j, end)
+        if q >= 0 and buf.find(b"\\", j, q) < 0:
+            try:
+                return str(view[j:q], "utf-8")
+            except UnicodeDecodeError:
+                pass
+    return _parse_content(view[start:end])
+
+
+async def iter_openai_sse_content(response: httpx.Response) -> AsyncGenerator[str, None]:
+    """
+    Yield the delta content of each event in a streaming chat completion.
+    
+    Works on raw bytes: lines are found with bytearray.find and the content
+    string is usually sliced out directly, without a str decode of the
+    line, Python-level line splitting, or a JSON parse.
+    Events without content (role-only first chunk, final chunk) and lines
+    that are not valid JSON are skipped. Stops at [DONE].
+    
+    Args:
+        response: Streaming httpx response from /v1/chat/completions
+    """
+    buf = bytearray()
+    scanned = 0  # bytes of buf already searched for a newline
+    async for chunk in response.aiter_bytes():
+        buf += chunk
+        start = 0
+        # Lines are checked in place (bounded startswith) and payloads are
+        # handed to orjson as memoryview slices, so no per-line copies are made
+        view = memoryview(buf)
+        try:
+            while True:
+                idx = buf.find(b"\n", scanned)
+                if idx < 0:
+                    break
+                line_start, end = start, idx
+                start = scanned = idx + 1
+                if end > line_start and buf[end - 1] == _CR:
+                    end -= 1
+                
+                if not buf.startswith(_DATA_PREFIX, line_start, end):
+                    continue
+                if end - line_start == _DATA_DONE_LEN and buf.startswith(_DATA_DONE, line_start):
+                    return
+                
+                content = _extract_content(buf, view, line_start + 6, end)
+                if content:
+                    yield content
+        finally:
+            # The bytearray cannot be resized while a view is exported
+            view.release()
+        
+        # Drop consumed lines once per network chunk; a partial line stays
+        # and is not searched again
+        if start:
+            del buf[:start]
+        scanned = len(buf)
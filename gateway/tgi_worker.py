@@ -9,11 +9,15 @@ so this is largely the same as VLLMWorker. The key differences:
 
 We keep a separate class for clarity and future TGI-specific features.
 """
+import asyncio
 import os
-import json
 import httpx
+import orjson
 from typing import AsyncGenerator
 
+from http_client import JSON_HEADERS, SSE_HEADERS, shared_transport
+from sse import iter_openai_sse_content
+
 
 class TGIWorker:
     """
@@ -38,32 +42,43 @@ class TGIWorker:
         self.base_url = base_url or os.getenv("TGI_URL", "http://tgi:8000")
         self.timeout = timeout
         self.model = None
+        self._model_lock = asyncio.Lock()
         
         self._client = httpx.AsyncClient(
             base_url=self.base_url,
-            timeout=httpx.Timeout(timeout, connect=10.0)
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            # One pool for all workers (see http_client.py)
+            transport=shared_transport()
         )
     
     async def _get_model_name(self) -> str:
-        """Discover the model name from TGI."""
+        """Discover the model name from TGI (one request shared by concurrent callers)."""
         if self.model:
             return self.model
         
-        try:
-            response = await self._client.get("/v1/models")
-            response.raise_for_status()
-            models = response.json()
-            if models.get("data"):
-                self.model = models["data"][0]["id"]
+        async with self._model_lock:
+            if self.model:
                 return self.model
-        except Exception:
-            pass
+            try:
+                response = await self._client.get("/v1/models")
+                if response.status_code >= 400:
+                    return "unknown"
+                models = orjson.loads(response.content)
+                if models.get("data"):
+                    self.model = models["data"][0]["id"]
+                    return self.model
+            except Exception:
+                pass
         
         return "unknown"
     
+    async def warmup(self):
+        """Discover the model name before the first request arrives."""
+        await self._get_model_name()
+    
     async def generate(self, prompt: str, max_tokens: int = 100) -> str:
         """Generate a non-streaming response via TGI."""
-        model = await self._get_model_name()
+        model = self.model or await self._get_model_name()
         
         payload = {
             "model": model,
@@ -75,14 +90,14 @@ class TGIWorker:
         try:
             response = await self._client.post(
                 "/v1/chat/completions",
-                json=payload
+                content=orjson.dumps(payload),
+                headers=JSON_HEADERS
             )
-            response.raise_for_status()
-            data = response.json()
+            if response.status_code >= 400:
+                raise RuntimeError(f"TGI request failed: {response.status_code} - {response.text}")
+            data = orjson.loads(response.content)
             return data["choices"][0]["message"]["content"]
             
-        except httpx.HTTPStatusError as e:
-            raise RuntimeError(f"TGI request failed: {e.response.status_code} - {e.response.text}")
         except httpx.RequestError as e:
             raise RuntimeError(f"TGI connection failed: {e}")
     
@@ -94,7 +109,40 @@ class TGIWorker:
             data: {"choices": [{"delta": {"content": "Hello"}}]}
             data: [DONE]
         """
-        model = await self._get_model_name()
+        model = self.model or await self._get_model_name()
+        
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        
+        try:
+            async with self._client.stream(
+                "POST",
+                "/v1/chat/completions",
+                content=orjson.dumps(payload),
+                headers=SSE_HEADERS
+            ) as response:
+                if response.status_code >= 400:
+                    raise RuntimeError(f"TGI streaming failed: {response.status_code}")
+                
+                async for content in iter_openai_sse_content(response):
+                    yield content
+        
+        except httpx.RequestError as e:
+            raise RuntimeError(f"TGI connection failed: {e}")
+    
+    async def generate_stream_raw(self, prompt: str, max_tokens: int = 100) -> AsyncGenerator[bytes, None]:
+        """
+        Stream TGI's SSE response bytes unchanged.
+        
+        Upstream already emits OpenAI-format chunks (including the final
+        chunk and data: [DONE]), so the gateway can forward them as-is
+        instead of parsing and re-serializing every token.
+        """
+        model = self.model or await self._get_model_name()
         
         payload = {
             "model": model,
@@ -107,31 +155,15 @@ class TGIWorker:
             async with self._client.stream(
                 "POST",
                 "/v1/chat/completions",
-                json=payload
+                content=orjson.dumps(payload),
+                headers=SSE_HEADERS
             ) as response:
-                response.raise_for_status()
+                if response.status_code >= 400:
+                    raise RuntimeError(f"TGI streaming failed: {response.status_code}")
                 
-                async for line in response.aiter_lines():
-                    if not line:
-                        continue
+                async for chunk in response.aiter_bytes():
+                    yield chunk
                     
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        
-                        if data == "[DONE]":
-                            break
-                        
-                        try:
-                            chunk = json.loads(data)
-                            delta = chunk.get("choices", [{}])[0].get("delta", {})
-                            content = delta.get("content", "")
-                            if content:
-                                yield content
-                        except json.JSONDecodeError:
-                            continue
-                            
-        except httpx.HTTPStatusError as e:
-            raise RuntimeError(f"TGI streaming failed: {e.response.status_code}")
         except httpx.RequestError as e:
             raise RuntimeError(f"TGI connection failed: {e}")
     
@@ -144,5 +176,15 @@ class TGIWorker:
             return False
     
     async def close(self):
-        """Close the HTTP client."""
-        await self._client.aclose()
+        """
+        Release the worker's HTTP client.
+        
+        The connection pool is shared by all workers, so it is left open here
+        and closed by http_client.close_shared_transport() on shutdown.
+        """
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,48 @@
+"""
+Token counting for usage reporting.
+
+Counts use tiktoken's cl100k_base BPE when it is installed. That is an
+approximation for vLLM/TGI models, which have their own tokenizers, but it is
+much closer than a character count. Without tiktoken, or if the encoding
+cannot be loaded, falls back to a ~4 chars/token estimate.
+
+tiktoken downloads encoding files on first use, so the encoding is loaded
+once by load_encoding() at startup (off the event loop), never from a request.
+The gateway image bakes the file in via TIKTOKEN_CACHE_DIR.
+"""
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+ENCODING_NAME = "cl100k_base"
+
+_encoding = None
+
+
+def load_encoding():
+    """Load the BPE encoding (blocking; may download it on first use)."""
+    global _encoding
+    if tiktoken is None or _encoding is not None:
+        return
+    try:
+        _encoding = tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        print(f"[Gateway] tiktoken encoding {ENCODING_NAME} unavailable, estimating token counts: {e}")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in text.
+
+    Args:
+        text: Prompt or completion text
+
+    Returns:
+        BPE token count, or a length-based estimate when no encoding is loaded
+    """
+    if not text:
+        return 0
+    if _encoding is None:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode_ordinary(text))
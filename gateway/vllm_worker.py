@@ -5,11 +5,15 @@ This worker matches the same interface as EchoWorker but calls a real LLM.
 Key learning: vLLM exposes an OpenAI-compatible API, so we can use httpx
 to make HTTP requests just like calling OpenAI's API.
 """
+import asyncio
 import os
-import json
 import httpx
+import orjson
 from typing import AsyncGenerator
 
+from http_client import JSON_HEADERS, SHARED_LIMITS, SSE_HEADERS, make_transport, shared_transport
+from sse import iter_openai_sse_content
+
 
 class VLLMWorker:
     """
@@ -22,42 +26,65 @@ class VLLMWorker:
         POST /v1/chat/completions - Chat completions (what we use)
     """
     
-    def __init__(self, base_url: str = None, timeout: float = 120.0):
+    def __init__(self, base_url: str = None, timeout: float = 120.0, uds: str = None):
         """
         Initialize the vLLM worker.
         
         Args:
             base_url: vLLM server URL (default: from VLLM_URL env var)
             timeout: Request timeout in seconds (model inference can be slow)
+            uds: Unix socket path of a colocated vLLM (used instead of TCP)
         """
         self.base_url = base_url or os.getenv("VLLM_URL", "http://localhost:8001")
         self.timeout = timeout
         self.model = None  # Will be discovered from vLLM
+        self._model_lock = asyncio.Lock()
         
-        # Use a persistent client for connection pooling
-        self._client = httpx.AsyncClient(
-            base_url=self.base_url,
-            timeout=httpx.Timeout(timeout, connect=10.0)
-        )
+        # Use a persistent client for connection pooling. When vLLM is
+        # colocated and listening on a Unix socket, talk to it directly and
+        # skip the TCP loopback stack; the host in the URL is then only used
+        # for the Host header.
+        self.uds = uds
+        if self.uds:
+            self._client = httpx.AsyncClient(
+                base_url="http://localhost",
+                timeout=httpx.Timeout(timeout, connect=10.0),
+                transport=make_transport(limits=SHARED_LIMITS, uds=self.uds)
+            )
+        else:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(timeout, connect=10.0),
+                # One pool for all workers (see http_client.py)
+                transport=shared_transport()
+            )
     
     async def _get_model_name(self) -> str:
-        """Discover the model name from vLLM (cached after first call)."""
+        """Discover the model name from vLLM (cached; one request shared by concurrent callers)."""
         if self.model:
             return self.model
         
-        try:
-            response = await self._client.get("/v1/models")
-            response.raise_for_status()
-            models = response.json()
-            if models.get("data"):
-                self.model = models["data"][0]["id"]
+        async with self._model_lock:
+            if self.model:
                 return self.model
-        except Exception:
-            pass
+            try:
+                response = await self._client.get("/v1/models")
+                if response.status_code >= 400:
+                    return "unknown"
+                models = orjson.loads(response.content)
+                if models.get("data"):
+                    self.model = models["data"][0]["id"]
+                    return self.model
+            except Exception:
+                pass
         
         # Fallback
         return "unknown"
     
+    async def warmup(self):
+        """Discover the model name before the first request arrives."""
+        await self._get_model_name()
+    
     async def generate(self, prompt: str, max_tokens: int = 100) -> str:
         """
         Generate a non-streaming response.
@@ -71,7 +98,7 @@ class VLLMWorker:
         Returns:
             Generated response text
         """
-        model = await self._get_model_name()
+        model = self.model or await self._get_model_name()
         
         payload = {
             "model": model,
@@ -83,16 +110,16 @@ class VLLMWorker:
         try:
             response = await self._client.post(
                 "/v1/chat/completions",
-                json=payload
+                content=orjson.dumps(payload),
+                headers=JSON_HEADERS
             )
-            response.raise_for_status()
-            data = response.json()
+            if response.status_code >= 400:
+                raise RuntimeError(f"vLLM request failed: {response.status_code} - {response.text}")
+            data = orjson.loads(response.content)
             
             # Extract the response content
             return data["choices"][0]["message"]["content"]
             
-        except httpx.HTTPStatusError as e:
-            raise RuntimeError(f"vLLM request failed: {e.response.status_code} - {e.response.text}")
         except httpx.RequestError as e:
             raise RuntimeError(f"vLLM connection failed: {e}")
     
@@ -115,7 +142,7 @@ class VLLMWorker:
         Yields:
             Token strings as they arrive from vLLM
         """
-        model = await self._get_model_name()
+        model = self.model or await self._get_model_name()
         
         payload = {
             "model": model,
@@ -128,34 +155,56 @@ class VLLMWorker:
             async with self._client.stream(
                 "POST",
                 "/v1/chat/completions",
-                json=payload
+                content=orjson.dumps(payload),
+                headers=SSE_HEADERS
             ) as response:
-                response.raise_for_status()
+                if response.status_code >= 400:
+                    raise RuntimeError(f"vLLM streaming failed: {response.status_code}")
                 
-                # Parse SSE events
-                async for line in response.aiter_lines():
-                    if not line:
-                        continue
-                    
-                    # SSE lines start with "data: "
-                    if line.startswith("data: "):
-                        data = line[6:]  # Remove "data: " prefix
-                        
-                        if data == "[DONE]":
-                            break
-                        
-                        try:
-                            chunk = json.loads(data)
-                            # Extract content from delta
-                            delta = chunk.get("choices", [{}])[0].get("delta", {})
-                            content = delta.get("content", "")
-                            if content:
-                                yield content
-                        except json.JSONDecodeError:
-                            continue
-                            
-        except httpx.HTTPStatusError as e:
-            raise RuntimeError(f"vLLM streaming failed: {e.response.status_code}")
+                # Parse SSE events (byte-level, see sse.py)
+                async for content in iter_openai_sse_content(response):
+                    yield content
+        
+        except httpx.RequestError as e:
+            raise RuntimeError(f"vLLM connection failed: {e}")
+    
+    async def generate_stream_raw(self, prompt: str, max_tokens: int = 100) -> AsyncGenerator[bytes, None]:
+        """
+        Stream vLLM's SSE response bytes unchanged.
+        
+        vLLM already emits OpenAI-format chunks (including the final chunk
+        and data: [DONE]), so the gateway can forward them as-is instead of
+        parsing and re-serializing every token.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens to generate
+            
+        Yields:
+            SSE byte chunks as they arrive from vLLM
+        """
+        model = self.model or await self._get_model_name()
+        
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        
+        try:
+            async with self._client.stream(
+                "POST",
+                "/v1/chat/completions",
+                content=orjson.dumps(payload),
+                headers=SSE_HEADERS
+            ) as response:
+                if response.status_code >= 400:
+                    raise RuntimeError(f"vLLM streaming failed: {response.status_code}")
+                
+                async for chunk in response.aiter_bytes():
+                    yield chunk
+        
         except httpx.RequestError as e:
             raise RuntimeError(f"vLLM connection failed: {e}")
     
@@ -168,5 +217,18 @@ class VLLMWorker:
             return False
     
     async def close(self):
-        """Close the HTTP client."""
-        await self._client.aclose()
+        """
+        Release the worker's HTTP client.
+        
+        The TCP connection pool is shared by all workers, so it is left open
+        here and closed by http_client.close_shared_transport() on shutdown.
+        A Unix socket client owns its transport and is closed.
+        """
+        if self.uds:
+            await self._client.aclose()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -2,20 +2,67 @@
 CPU-based echo worker for M1 - simulates streaming LLM responses.
 """
 import asyncio
+import os
 import random
 from typing import AsyncGenerator
 
 
+def _echo_words(words: list[str], rng: random.Random) -> list[str]:
+    """Echo words back, bracketing ~30% of them as variation."""
+    # All keep/bracket decisions come from one choices() call
+    keep = rng.choices((True, False), weights=(0.7, 0.3), k=len(words))
+    return [word if k else f"[{word}]" for word, k in zip(words, keep)]
+
+
+def _response_words(
+    words: list[str],
+    additional: list[str],
+    max_tokens: int,
+    rng: random.Random
+) -> list[str]:
+    """
+    Build at most max_tokens response words: "Echo:", echoed prompt words,
+    then filler from additional.
+    
+    The list is allocated once at its final upper bound and filled by slice,
+    instead of growing through append/extend and being sliced again at the
+    end. The bound is never larger than the words available, whatever
+    max_tokens the client sent.
+    """
+    size = min(max_tokens, 1 + len(words) + len(additional))
+    if size <= 0:
+        return []
+    out = [None] * size
+    out[0] = "Echo:"
+    n = 1
+    
+    echoed = _echo_words(words[:size - n], rng)
+    out[n:n + len(echoed)] = echoed
+    n += len(echoed)
+    
+    filler = additional[:size - n]
+    out[n:n + len(filler)] = filler
+    n += len(filler)
+    
+    del out[n:]
+    return out
+
+
 class EchoWorker:
     """
     Simple echo worker that simulates LLM inference by echoing back
     the input with some variation. Used for M1 to test the service
     infrastructure before connecting real engines.
+    
+    Set ECHO_SEED to make responses and token delays reproducible across
+    benchmark runs.
     """
     
     def __init__(self):
         self.min_delay = 0.05  # Minimum delay between tokens (seconds)
         self.max_delay = 0.15  # Maximum delay between tokens
+        seed = os.getenv("ECHO_SEED")
+        self._rng = random.Random(int(seed) if seed else None)
     
     async def generate(self, prompt: str, max_tokens: int = 100) -> str:
         """
@@ -31,25 +78,9 @@ class EchoWorker:
         # Simulate some processing time
         await asyncio.sleep(0.1)
         
-        # Echo with variation
-        words = prompt.split()
-        response_words = []
-        
-        # Add a prefix
-        response_words.append("Echo:")
-        
-        # Echo back words with some variation
-        for i, word in enumerate(words[:max_tokens]):
-            if random.random() > 0.3:  # 70% chance to echo
-                response_words.append(word)
-            else:  # 30% chance to add variation
-                response_words.append(f"[{word}]")
-        
-        # Add some additional tokens
+        # Echo with variation, padded with some additional tokens
         additional = ["This", "is", "a", "simulated", "response", "from", "the", "echo", "worker."]
-        response_words.extend(additional[:max(0, max_tokens - len(response_words))])
-        
-        return " ".join(response_words[:max_tokens])
+        return " ".join(_response_words(prompt.split(), additional, max_tokens, self._rng))
     
     async def generate_stream(self, prompt: str, max_tokens: int = 100) -> AsyncGenerator[str, None]:
         """
@@ -65,27 +96,27 @@ class EchoWorker:
         # Simulate initial processing delay (prefill)
         await asyncio.sleep(0.1)
         
-        # Generate response
-        words = prompt.split()
-        response_words = []
-        
-        # Add prefix
-        response_words.append("Echo:")
-        
-        # Echo back words
-        for word in words[:max_tokens]:
-            if random.random() > 0.3:
-                response_words.append(word)
-            else:
-                response_words.append(f"[{word}]")
-        
-        # Add additional tokens
+        # Generate response (echoed words plus additional tokens)
         additional = ["This", "is", "a", "simulated", "streaming", "response."]
-        response_words.extend(additional[:max(0, max_tokens - len(response_words))])
+        response_words = _response_words(prompt.split(), additional, max_tokens, self._rng)
         
-        # Stream tokens with delay
-        for word in response_words[:max_tokens]:
+        # Stream tokens with delay. Delays are drawn up front and slept to
+        # absolute deadlines, so time spent by the consumer between tokens
+        # does not add to the simulated decode time.
+        uniform = self._rng.uniform
+        delays = [uniform(self.min_delay, self.max_delay) for _ in response_words]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        for word, delay in zip(response_words, delays):
             yield word + " "
-            delay = random.uniform(self.min_delay, self.max_delay)
-            await asyncio.sleep(delay)
-
+            deadline += delay
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+    
+    async def close(self):
+        """Nothing to release; present so all workers share one lifecycle."""
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -9,7 +9,9 @@ This implements the Factory Pattern:
 M3 Addition:
   - create_worker_for_backend() creates worker based on X-Backend header
 """
+import asyncio
 import os
+import threading
 from typing import Union, Optional
 
 from worker import EchoWorker
@@ -21,8 +23,13 @@ from trtllm_worker import TRTLLMWorker
 # Type alias for any worker
 Worker = Union[EchoWorker, VLLMWorker, TGIWorker, TRTLLMWorker]
 
-# Worker cache (avoid recreating workers for same backend)
-_worker_cache: dict[str, Worker] = {}
+# Worker cache (avoid recreating workers for same backend). Lookups are
+# lock-free; creation is serialized so two threads missing at once cannot
+# each build a worker (and its own connection pool) for the same URL.
+# Keyed by (backend, backend_url): one URL served as two backend types gets
+# two workers of the right class instead of whichever was created first.
+_worker_cache: dict[tuple[str, str], Worker] = {}
+_worker_cache_lock = threading.Lock()
 
 
 def create_worker() -> Worker:
@@ -32,6 +39,7 @@ def create_worker() -> Worker:
     Environment Variables:
         WORKER_TYPE: 'echo' or 'vllm' (default: 'echo')
         VLLM_URL: URL for vLLM server (default: 'http://localhost:8001')
+        VLLM_UDS: Unix socket of a colocated vLLM server (overrides VLLM_URL)
     
     Returns:
         Worker instance (EchoWorker or VLLMWorker)
@@ -40,8 +48,12 @@ def create_worker() -> Worker:
     
     if worker_type == "vllm":
         vllm_url = os.getenv("VLLM_URL", "http://localhost:8001")
-        print(f"[Gateway] Using VLLMWorker at {vllm_url}")
-        return VLLMWorker(base_url=vllm_url)
+        vllm_uds = os.getenv("VLLM_UDS")
+        if vllm_uds:
+            print(f"[Gateway] Using VLLMWorker at unix:{vllm_uds}")
+        else:
+            print(f"[Gateway] Using VLLMWorker at {vllm_url}")
+        return VLLMWorker(base_url=vllm_url, uds=vllm_uds)
     
     elif worker_type == "echo":
         print("[Gateway] Using EchoWorker (CPU-based simulation)")
@@ -66,25 +78,43 @@ def create_worker_for_backend(backend: str, backend_url: str) -> Worker:
     Returns:
         Worker instance connected to the specified backend
     """
-    global _worker_cache
+    key = (backend, backend_url)
+    worker = _worker_cache.get(key)
+    if worker is not None:
+        return worker
     
-    if backend_url in _worker_cache:
-        return _worker_cache[backend_url]
-    
-    # Create appropriate worker type
-    if backend.startswith("tgi"):
-        worker = TGIWorker(base_url=backend_url)
-    elif backend.startswith("trt"):
-        worker = TRTLLMWorker(base_url=backend_url)
-    else:
-        worker = VLLMWorker(base_url=backend_url)
-    
-    _worker_cache[backend_url] = worker
+    with _worker_cache_lock:
+        worker = _worker_cache.get(key)
+        if worker is not None:
+            return worker
+        
+        # Create appropriate worker type
+        if backend.startswith("tgi"):
+            worker = TGIWorker(base_url=backend_url)
+        elif backend.startswith("trt"):
+            worker = TRTLLMWorker(base_url=backend_url)
+        else:
+            worker = VLLMWorker(base_url=backend_url)
+        
+        _worker_cache[key] = worker
     print(f"[Gateway] Created {type(worker).__name__} for backend: {backend} at {backend_url}")
     
     return worker
 
 
+async def shutdown_all():
+    """
+    Close every cached backend worker and empty the cache.
+    
+    Called from the app lifespan on shutdown (and on each --reload), so
+    worker clients are not leaked across process recycles.
+    """
+    with _worker_cache_lock:
+        workers = list(_worker_cache.values())
+        _worker_cache.clear()
+    await asyncio.gather(*(w.close() for w in workers), return_exceptions=True)
+
+
 # Available worker types for documentation
 WORKER_TYPES = {
     "echo": "CPU-based echo worker for testing (no GPU required)",